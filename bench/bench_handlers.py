@@ -0,0 +1,209 @@
+"""Offline handler benchmark: /start, हर callback route और free-text messages पूरे handler pipeline से
+
+    python bench/bench_handlers.py --users 1000,10000,100000 --updates 20000
+    python bench/bench_handlers.py --users 5000 --gemini-latency-ms 300 --gemini-error-rate 0.2
+
+Bot API bench/offline.py का OfflineRequest है, Gemini एक stub model जिसकी latency और error rate
+flags से तय होते हैं। Updates Application.process_update से असली update processor (per-chat
+ordering, concurrency cap) के रास्ते चलते हैं। Text messages की latency में debounced Gemini
+reply भी शामिल है (DEBOUNCE_WINDOW_MS=0 रखा जाता है, वरना हर reply में बस fixed देरी जुड़ती)।
+हर users-count अलग subprocess में चलता है, ताकि memory growth एक-दूसरे में न मिले।
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+os.environ.setdefault('USER_STORE_BACKEND', 'memory')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1000001:offline-bench-token')
+os.environ.pop('GEMINI_API_KEY', None)
+for name in ('RATE_LIMIT_GLOBAL_PER_SEC', 'RATE_LIMIT_CHAT_PER_SEC', 'RATE_LIMIT_GROUP_PER_MIN', 'RATE_LIMIT_CHAT_BURST'):
+    os.environ.setdefault(name, '1000000')
+os.environ.setdefault('DEBOUNCE_WINDOW_MS', '0')
+os.environ.setdefault('GEMINI_MAX_WORKERS', '64')
+os.environ.setdefault('PROFILE_SLOW_UPDATE_MS', '0')
+
+from load_webhook import percentile
+
+COMMANDS = ['/start', '/help', '/games', '/mood', '/horoscope', '/stats', '/settings', '/about']
+TEXTS = ['hi', 'kaisi ho?', 'good night', 'aaj mood thoda off hai', 'tum kya kar rahi ho',
+         'mujhe tumhari yaad aa rahi thi', 'office mein bahut kaam tha aaj, thak gaya hoon']
+
+class StubModel:
+    """genai.GenerativeModel की जगह: executor thread में latency तक sleep, error_rate से exception"""
+
+    def __init__(self, latency_ms, error_rate, seed):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _maybe_fail(self):
+        with self.lock:
+            failed = self.rng.random() < self.error_rate
+        if failed:
+            raise RuntimeError('stub Gemini error')
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        with self.lock:
+            self.calls += 1
+        if stream:
+            return self._stream()
+        time.sleep(self.latency)
+        self._maybe_fail()
+        return types.SimpleNamespace(text='Aww baby, main bhi tumhe yaad kar rahi thi! 💕', usage_metadata=None)
+
+    def _stream(self):
+        for part in ('Aww baby, ', 'main bhi tumhe ', 'yaad kar rahi thi! 💕'):
+            time.sleep(self.latency / 3)
+            self._maybe_fail()
+            yield types.SimpleNamespace(text=part, parts=[part], usage_metadata=None)
+
+def callback_datas(main):
+    """हर registered route और हर screen के buttons का callback_data"""
+    datas = set(main.callback_router.exact)
+    screens = list(main.SCREENS.values())
+    screens += [main.settings_screen('Sweet', 'happy', True), main.mood_screen('happy'), main.personality_screen(0)]
+    for screen in screens:
+        if screen.markup:
+            for row in screen.markup.inline_keyboard:
+                datas.update(button.callback_data for button in row if button.callback_data)
+    return sorted(datas)
+
+def synthetic_update(update_id, rng, user_id, datas, text_ratio, callback_ratio):
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'Bench{user_id}'}
+    chat = {'id': user_id, 'type': 'private', 'first_name': user['first_name']}
+    now = int(time.time())
+    kind = rng.random()
+    if kind < callback_ratio:
+        return 'callback', {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': rng.choice(datas),
+                'message': {'message_id': 1, 'date': now, 'chat': chat, 'text': 'menu'},
+            },
+        }
+    message = {'message_id': update_id, 'date': now, 'chat': chat, 'from': user}
+    if kind < callback_ratio + text_ratio:
+        message['text'] = rng.choice(TEXTS)
+        return 'text', {'update_id': update_id, 'message': message}
+    message['text'] = rng.choice(COMMANDS)
+    message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(message['text'])}]
+    return 'command', {'update_id': update_id, 'message': message}
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+async def run_child(args):
+    import main
+    from telegram import Update
+    from offline import OfflineRequest
+
+    main.model = StubModel(args.gemini_latency_ms, args.gemini_error_rate, args.seed)
+    request = OfflineRequest(latency_ms=args.api_latency_ms)
+    application = main.build_application(request)
+    rng = random.Random(args.seed)
+    datas = callback_datas(main)
+
+    async with application:
+        await main.post_init(application)
+        await application.start()
+        # पहले से parse किए updates, ताकि timer में सिर्फ handling गिने
+        updates = []
+        for update_id in range(1, args.updates + 1):
+            user_id = 10**6 + rng.randrange(args.users)
+            kind, payload = synthetic_update(update_id, rng, user_id, datas, args.text_ratio, args.callback_ratio)
+            updates.append((kind, user_id, Update.de_json(payload, application.bot)))
+        rss_before = rss_mb()
+        latencies = {'command': [], 'callback': [], 'text': []}
+        pending = iter(updates)
+
+        async def handle(kind, user_id, update):
+            await application.process_update(update)
+            burst = main._bursts.get(user_id)
+            if kind == 'text' and burst is not None and burst.task is not None:
+                await asyncio.wait({burst.task})
+
+        async def worker():
+            for kind, user_id, update in pending:
+                started = time.perf_counter()
+                await application.update_processor.process_update(update, handle(kind, user_id, update))
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        rss_after = rss_mb()
+        await application.stop()
+        await main.post_shutdown(application)
+
+    fallbacks = sum(main.GEMINI_FALLBACKS.series.values())
+    result = {
+        'users': args.users, 'updates': args.updates, 'elapsed': elapsed,
+        'rate': args.updates / elapsed, 'rss_before': rss_before, 'rss_after': rss_after,
+        'cached_users': len(main.user_data), 'gemini_calls': main.model.calls, 'fallbacks': fallbacks,
+        'api_calls': sum(request.calls.values()), 'latency': {},
+    }
+    for kind, values in list(latencies.items()) + [('all', [v for vs in latencies.values() for v in vs])]:
+        values.sort()
+        result['latency'][kind] = [len(values)] + [percentile(values, pct) for pct in (50, 95, 99)]
+    print(json.dumps(result))
+
+def report(result):
+    growth = result['rss_after'] - result['rss_before']
+    print(f"\n{result['users']:,} users, {result['updates']:,} updates in {result['elapsed']:.2f}s "
+          f"→ {result['rate']:,.0f} updates/s")
+    for kind, (count, p50, p95, p99) in result['latency'].items():
+        print(f"  {kind:<9} n={count:<7} p50 {p50:7.2f}ms  p95 {p95:7.2f}ms  p99 {p99:7.2f}ms")
+    per_user = growth * 1024 / result['cached_users'] if result['cached_users'] else 0.0
+    print(f"  memory    RSS {result['rss_before']:.1f} → {result['rss_after']:.1f} MB (+{growth:.1f} MB, "
+          f"{result['cached_users']:,} cached users, ~{per_user:.2f} KB/user)")
+    print(f"  gemini    {result['gemini_calls']:,} calls, {result['fallbacks']:,} fallbacks; "
+          f"Bot API {result['api_calls']:,} calls")
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default='1000,10000,100000', help='comma-separated simulated user counts')
+    parser.add_argument('--updates', type=int, default=20000, help='हर users-count पर कितने updates')
+    parser.add_argument('--concurrency', type=int, default=256, help='एक साथ कितने updates in flight')
+    parser.add_argument('--text-ratio', type=float, default=0.6)
+    parser.add_argument('--callback-ratio', type=float, default=0.3)
+    parser.add_argument('--gemini-latency-ms', type=float, default=20)
+    parser.add_argument('--gemini-error-rate', type=float, default=0.0)
+    parser.add_argument('--api-latency-ms', type=float, default=0, help='हर Bot API call में नकली network delay')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.users = int(args.users)
+        asyncio.run(run_child(args))
+        return
+
+    print(f"CPUs: {os.cpu_count()}, Gemini stub {args.gemini_latency_ms:g}ms / {args.gemini_error_rate:.0%} errors, "
+          f"mix text {args.text_ratio:.0%} callback {args.callback_ratio:.0%}")
+    options = [f"--{name.replace('_', '-')}={value}" for name, value in vars(args).items()
+               if name not in ('users', 'child')]
+    for users in args.users.split(','):
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', f'--users={users}'] + options,
+            capture_output=True, text=True, check=True,
+        )
+        report(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,90 @@
+"""User state का memory footprint: पुराने dict-of-dicts बनाम UserProfile records
+
+    python bench/bench_memory.py --sizes 10000,100000,1000000
+
+हर (size, layout) अलग subprocess में नापा जाता है ताकि पिछले run का heap असर न डाले।
+"""
+import argparse
+import datetime
+import os
+import random
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('USER_STORE_BACKEND', 'memory')
+
+ZODIACS = ['aries', 'taurus', 'gemini', 'cancer', 'leo', 'virgo', 'libra',
+           'scorpio', 'sagittarius', 'capricorn', 'aquarius', 'pisces']
+
+def synthetic_fields(i, rng):
+    """एक active user के लिए वही values जो handlers लिखते हैं (callback data से बनी नई strings)"""
+    moods = [('mood_' + rng.choice(['happy', 'sad', 'love', 'excited'])).replace('mood_', '') for _ in range(10)]
+    return {
+        'name': f'User{i}',
+        'join_date': (datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i)).isoformat(),
+        'messages_count': rng.randint(0, 5000),
+        'interactions': rng.randint(0, 5000),
+        'games_played': rng.randint(0, 300),
+        'current_mood': moods[-1],
+        'chat_style': ('style_' + rng.choice(['Sweet', 'Flirty', 'Caring'])).replace('style_', ''),
+        'notifications': True,
+        'zodiac_sign': ('zodiac_' + rng.choice(ZODIACS)).replace('zodiac_', ''),
+        'game_number': rng.randint(1, 10),
+        'mood_history': moods,
+    }
+
+def legacy_test():
+    # पुराना handler हर बार list literal दोबारा बनाता था, यानी हर user की अपनी copy
+    return {"q": "तुम्हारा favorite time कौन सा है?",
+            "options": ["🌅 सुबह", "🌞 दोपहर", "🌅 शाम", "🌙 रात"],
+            "results": ["Early Bird - तुम energetic हो!", "Sunshine - तुम cheerful हो!",
+                        "Golden Hour - तुम romantic हो!", "Night Owl - तुम mysterious हो!"]}
+
+def build(layout, count):
+    import main
+    rng = random.Random(42)
+    store = {}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        values = synthetic_fields(i, rng)
+        if layout == 'dict':
+            record = dict(values)
+            record['current_test'] = legacy_test()
+        else:
+            record = main.UserProfile()
+            for key, value in values.items():
+                record.set(key, value)
+            record.set('current_test', main.PERSONALITY_TESTS[0])
+        store[100000000 + i] = record
+        del values
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--measure', nargs=2, metavar=('LAYOUT', 'COUNT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(build(args.measure[0], int(args.measure[1])))
+        return
+
+    print(f"{'users':>10}  {'dict-of-dicts':>14}  {'UserProfile':>12}  {'saving':>7}")
+    for count in (int(size) for size in args.sizes.split(',')):
+        results = {}
+        for layout in ('dict', 'profile'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--measure', layout, str(count)],
+                capture_output=True, text=True, check=True,
+            )
+            results[layout] = float(out.stdout.strip().splitlines()[-1])
+        saving = 1 - results['profile'] / results['dict']
+        print(f"{count:>10}  {results['dict']:>12.0f} B  {results['profile']:>10.0f} B  {saving:>6.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Callback routing throughput: पुरानी if/elif chain बनाम callback_router
+
+    python bench/bench_router.py --iterations 200000 --extra-routes 1000
+
+सिर्फ route resolve होने का cost नापा जाता है, handlers नहीं चलते।
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('USER_STORE_BACKEND', 'memory')
+
+import main
+
+# असली keyboards से आने वाला callback_data mix
+SAMPLE_DATA = [
+    'start_chat', 'about_me', 'mini_games', 'mood_selector', 'horoscope', 'user_stats',
+    'settings_main', 'mood_happy', 'mood_sad', 'game_number_guess', 'game_love_calc',
+    'guess_3', 'guess_10', 'personality_1', 'challenge_complete', 'zodiac_leo',
+    'new_horoscope', 'change_zodiac', 'mood_tips_sad', 'mood_music_love', 'back_to_main',
+    'setting_chat_style', 'setting_notifications', 'style_Flirty', 'achievements',
+    'detailed_stats', 'help_commands', 'help_settings',
+]
+
+def legacy_route(data):
+    """पुराने button_handler की comparisons उसी क्रम में (सिर्फ branch चुनता है)"""
+    if data == 'start_chat':
+        return 'start_chat'
+    elif data == 'about_me':
+        return 'about_me'
+    elif data == 'mini_games':
+        return 'mini_games'
+    elif data == 'mood_selector':
+        return 'mood_selector'
+    elif data == 'horoscope':
+        return 'horoscope'
+    elif data == 'user_stats':
+        return 'user_stats'
+    elif data == 'settings_main':
+        return 'settings_main'
+    elif data.startswith('mood_'):
+        return 'mood_'
+    elif data.startswith('game_'):
+        return 'game_'
+    elif data.startswith('guess_'):
+        return 'guess_'
+    elif data.startswith('personality_'):
+        return 'personality_'
+    elif data == 'challenge_complete':
+        return 'challenge_complete'
+    elif data.startswith('zodiac_'):
+        return 'zodiac_'
+    elif data in ['new_horoscope', 'weekly_horoscope', 'change_zodiac']:
+        return 'horoscope_actions'
+    elif data.startswith('mood_tips_') or data.startswith('mood_music_'):
+        return 'mood_extras'
+    elif data == 'back_to_main':
+        return 'back_to_main'
+    elif data.startswith('setting_'):
+        return 'setting_'
+    elif data.startswith('style_'):
+        return 'style_'
+    elif data in ['detailed_stats', 'achievements', 'memories', 'set_goals']:
+        return 'stats_pages'
+    elif data in ['help_commands', 'help_games', 'help_chat', 'help_settings']:
+        return 'help_section'
+    return None
+
+def measure(resolve, iterations):
+    data = (SAMPLE_DATA * (iterations // len(SAMPLE_DATA) + 1))[:iterations]
+    started = time.perf_counter()
+    for item in data:
+        resolve(item)
+    return iterations / (time.perf_counter() - started)
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--extra-routes', type=int, default=1000,
+                        help='router में इतने dummy exact और prefix routes और जोड़कर दोबारा नापें')
+    args = parser.parse_args()
+
+    router = main.callback_router
+    print(f"legacy if/elif chain : {measure(legacy_route, args.iterations):>12,.0f} routes/s")
+    print(f"callback_router      : {measure(router.resolve, args.iterations):>12,.0f} routes/s "
+          f"({len(router.exact)} exact, {len(router.prefixes)} prefixes)")
+
+    async def dummy(update, context, *args):
+        pass
+    for i in range(args.extra_routes):
+        router.route(f'extra_menu_{i}_open')(dummy)
+        router.prefix(f'extra{i}_')(dummy)
+    print(f"callback_router +{args.extra_routes:<5}: {measure(router.resolve, args.iterations):>12,.0f} routes/s "
+          f"({len(router.exact)} exact, {len(router.prefixes)} prefixes)")
+
+if __name__ == '__main__':
+    main_bench()
@@ -0,0 +1,59 @@
+"""Sharded workers throughput: worker processes की गिनती के साथ updates/s कैसे बढ़ता है
+
+    python bench/bench_shards.py --workers 1,2,4 --updates 20000
+
+हर run में असली start_shard_workers() के workers offline Bot API (bench/offline.py) के साथ चलते हैं।
+Timer पहले update को inbox में डालने से आखिरी worker के सब updates निपटाकर बंद होने तक चलता है।
+Scaling machine के cores पर निर्भर है, इसलिए CPU count साथ में print होता है।
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('USER_STORE_BACKEND', 'memory')
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1000001:offline-bench-token')
+# Offline API पर Telegram flood limits का कोई मतलब नहीं; यहाँ सिर्फ processing नापनी है
+for name in ('RATE_LIMIT_GLOBAL_PER_SEC', 'RATE_LIMIT_CHAT_PER_SEC', 'RATE_LIMIT_GROUP_PER_MIN', 'RATE_LIMIT_CHAT_BURST'):
+    os.environ.setdefault(name, '1000000')
+# Debounce window हर user के आखिरी reply में बस एक fixed देरी जोड़ता है
+os.environ.setdefault('DEBOUNCE_WINDOW_MS', '0')
+
+from telegram import Update
+
+import main
+from load_webhook import synthetic_update
+from offline import OfflineRequest
+
+def measure(shards, updates):
+    workers = main.start_shard_workers(shards, request=OfflineRequest())
+    for _, _, ready in workers:
+        ready.wait(60)
+    inboxes = [inbox for _, inbox, _ in workers]
+    started = time.perf_counter()
+    for update in updates:
+        inboxes[main.shard_for(update, shards)].put(update.to_json())
+    main.stop_shard_workers(workers, timeout=600)
+    return len(updates) / (time.perf_counter() - started)
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    updates = [Update.de_json(synthetic_update(i, rng, args.users), None) for i in range(1, args.updates + 1)]
+
+    print(f"CPUs: {os.cpu_count()}, updates: {args.updates}, users: {args.users}")
+    baseline = None
+    for shards in (int(n) for n in args.workers.split(',')):
+        rate = measure(shards, updates)
+        baseline = baseline or rate
+        print(f"{shards:>2} workers: {rate:>10,.0f} updates/s  ({rate / baseline:.2f}x)")
+
+if __name__ == '__main__':
+    main_bench()
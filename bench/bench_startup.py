@@ -0,0 +1,118 @@
+"""Cold start benchmark: import time और "time to first update" हर GEMINI_WARMUP mode में
+
+    python bench/bench_startup.py
+    python bench/bench_startup.py --modes eager,lazy --runs 3 --top 15
+
+1) `python -X importtime` से `import main` और उसके बाद Gemini SDK load का खर्च, सबसे महंगे imports के साथ।
+2) असली `python main.py` को bench/fake_telegram.py और bench/fake_gemini.py के सामने चलाकर process
+   start से पहले जवाब तक का समय (bot का अपना "पहले update का जवाब" log line)। हर run के लिए fake
+   servers नए शुरू होते हैं और सिर्फ एक text message भेजते हैं, ताकि पहला जवाब Gemini वाले रास्ते
+   से जाए और update backlog की भीड़ cold start में न गिनी जाए।
+"""
+import argparse
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH_DIR, '..')
+FIRST_REPLY = re.compile(r'पहले update का जवाब process start के ([\d.]+)s बाद')
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+def bench_env(**extra):
+    env = dict(os.environ, USER_STORE_BACKEND='memory', TELEGRAM_BOT_TOKEN='1000001:startup-bench',
+               GEMINI_API_KEY='startup-bench', PYTHONWARNINGS='ignore')
+    env.update(extra)
+    return env
+
+def import_profile(code):
+    """-X importtime का output: (wall seconds, [(cumulative_us, module)] सिर्फ top-level imports)"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                               env=bench_env(), capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    top_level = []
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and not match.group(3):
+            top_level.append((int(match.group(2)), match.group(4)))
+    return wall, top_level
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(script, *args):
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, script), *args],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    process.stdout.readline()   # "... पर" = server सुन रहा है
+    return process
+
+def first_reply(mode, gemini_latency_ms, timeout):
+    """Fake servers के सामने main.py चलाकर (bot का reported seconds, bench का wall seconds) लौटाता है"""
+    telegram_port, gemini_port = free_port(), free_port()
+    servers = [
+        start_server('fake_telegram.py', f'--port={telegram_port}', '--updates=1', '--rate=0', '--only-text',
+                     '--report-seconds=3600'),
+        start_server('fake_gemini.py', f'--port={gemini_port}', f'--latency-ms={gemini_latency_ms}',
+                     '--jitter-ms=0', '--report-seconds=3600'),
+    ]
+    env = bench_env(
+        GEMINI_WARMUP=mode, DEBOUNCE_WINDOW_MS='0', PROFILE_SLOW_UPDATE_MS='0',
+        TELEGRAM_API_BASE_URL=f'http://127.0.0.1:{telegram_port}',
+        GEMINI_API_BASE_URL=f'http://127.0.0.1:{gemini_port}',
+    )
+    started = time.perf_counter()
+    bot = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py')], cwd=ROOT, env=env,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    try:
+        deadline = started + timeout
+        for line in bot.stdout:
+            match = FIRST_REPLY.search(line)
+            if match:
+                return float(match.group(1)), time.perf_counter() - started
+            if time.perf_counter() > deadline:
+                break
+        raise RuntimeError(f"{mode}: {timeout}s में पहला जवाब नहीं आया")
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(30)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default='eager,background,lazy')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='सबसे महंगे कितने top-level imports दिखाएं')
+    parser.add_argument('--gemini-latency-ms', type=float, default=300)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    wall, imports = import_profile('import main')
+    sdk_wall, sdk_imports = import_profile('import main; main.load_gemini()')
+    total = sum(us for us, _ in imports) / 1e6
+    sdk_total = sum(us for us, _ in sdk_imports) / 1e6
+    print(f"import main              : {total:.2f}s imports ({wall:.2f}s wall, interpreter सहित)")
+    print(f"import main + Gemini SDK : {sdk_total:.2f}s imports ({sdk_wall:.2f}s wall)")
+    print("\nसबसे महंगे top-level imports (Gemini SDK load के साथ):")
+    for us, name in sorted(sdk_imports, reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {name}")
+
+    print(f"\nTime to first update (Gemini stub {args.gemini_latency_ms:g}ms, {args.runs} runs, median):")
+    for mode in args.modes.split(','):
+        results = sorted(first_reply(mode, args.gemini_latency_ms, args.timeout) for _ in range(args.runs))
+        reported, wall = results[len(results) // 2]
+        print(f"  {mode:<10} {reported:6.2f}s since process start ({wall:.2f}s bench wall)")
+
+if __name__ == '__main__':
+    main_bench()
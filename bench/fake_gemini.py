@@ -0,0 +1,125 @@
+"""Fake Gemini REST server: generateContent और streamGenerateContent, बिना असली API के
+
+    python bench/fake_gemini.py --port 8081 --latency-ms 400 --chunks 4 --error-rate 0.02
+    GEMINI_API_KEY=fake GEMINI_API_BASE_URL=http://127.0.0.1:8081 python main.py
+
+SDK का REST transport जो JSON भेजता/पढ़ता है वही यहाँ है। Streaming जवाब एक JSON array है
+जिसके elements chunk-by-chunk flush होते हैं, असली API की तरह। --latency-ms पहले chunk तक की
+देरी है, --chunk-ms हर अगले chunk की। --error-rate पर 503 (या --error-status) लौटता है।
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+
+import tornado.web
+
+REPLIES = [
+    "Aww baby, तुम्हारी बातें सुनकर मेरा दिन बन गया! 💕 बताओ ना, आज और क्या हुआ?",
+    "Hmm jaanu, थोड़ा आराम कर लो ना... main hoon na tumhare saath! 🤗✨",
+    "Hehe, तुम सच में बहुत cute हो! 🙈 चलो कुछ मज़ेदार बात करते हैं। 💖",
+]
+
+class Stats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.calls = {'generateContent': 0, 'streamGenerateContent': 0, 'countTokens': 0}
+        self.errors = 0
+
+stats = Stats()
+
+def response_chunk(text, prompt_tokens, reply_tokens, final):
+    chunk = {
+        'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}],
+        'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': reply_tokens,
+                          'totalTokenCount': prompt_tokens + reply_tokens},
+    }
+    if final:
+        chunk['candidates'][0]['finishReason'] = 'STOP'
+    return chunk
+
+class CountTokensHandler(tornado.web.RequestHandler):
+    """Bot startup पर prompt token savings log करने के लिए countTokens बुलाता है"""
+
+    def post(self, model):
+        stats.calls['countTokens'] += 1
+        self.finish({'totalTokens': max(1, len(self.request.body) // 4)})
+
+class GenerateHandler(tornado.web.RequestHandler):
+    def initialize(self, args):
+        self.args = args
+
+    async def post(self, model, method):
+        args = self.args
+        stats.calls[method] += 1
+        try:
+            body = json.loads(self.request.body or b'{}')
+        except ValueError:
+            body = {}
+        prompt_tokens = max(1, len(json.dumps(body.get('contents', ''), ensure_ascii=False)) // 4)
+        await asyncio.sleep(random.uniform(args.latency_ms, args.latency_ms + args.jitter_ms) / 1000)
+
+        if random.random() < args.error_rate:
+            stats.errors += 1
+            self.set_status(args.error_status)
+            self.finish({'error': {'code': args.error_status, 'message': 'fake Gemini error', 'status': 'UNAVAILABLE'}})
+            return
+
+        reply = random.choice(REPLIES)
+        reply_tokens = max(1, len(reply) // 4)
+        self.set_header('Content-Type', 'application/json; charset=UTF-8')
+        if method == 'generateContent':
+            self.finish(json.dumps(response_chunk(reply, prompt_tokens, reply_tokens, True), ensure_ascii=False))
+            return
+
+        words = reply.split(' ')
+        size = max(1, -(-len(words) // args.chunks))
+        parts = [' '.join(words[i:i + size]) + ' ' for i in range(0, len(words), size)]
+        for index, part in enumerate(parts):
+            if index:
+                await asyncio.sleep(args.chunk_ms / 1000)
+            final = index == len(parts) - 1
+            chunk = response_chunk(part.rstrip() if final else part, prompt_tokens, reply_tokens, final)
+            self.write(('[' if index == 0 else ',\r\n') + json.dumps(chunk, ensure_ascii=False))
+            await self.flush()
+        self.finish(']')
+
+async def report_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.monotonic() - stats.started
+        total = sum(stats.calls.values())
+        print(f"[fake-gemini] {total} calls ({total / elapsed:.0f}/s) {stats.calls}, errors {stats.errors}", flush=True)
+
+async def serve(args):
+    app = tornado.web.Application([
+        (r'/v1beta/(?:models|tunedModels)/([^/:]+):(generateContent|streamGenerateContent)', GenerateHandler, {'args': args}),
+        (r'/v1beta/models/([^/:]+):countTokens', CountTokensHandler),
+    ])
+    # Injected errors हर request पर access log न भरें
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+    app.listen(args.port, args.host)
+    print(f"Fake Gemini http://{args.host}:{args.port} पर", flush=True)
+    await report_loop(args.report_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=300, help='पहले chunk (या पूरे reply) तक की देरी')
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--chunks', type=int, default=3, help='Streaming reply कितने chunks में')
+    parser.add_argument('--chunk-ms', type=float, default=80)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--report-seconds', type=float, default=5)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Fake Telegram Bot API server: scripted getUpdates stream, injected 429s और latency
+
+    python bench/fake_telegram.py --port 8082 --updates 50000 --rate 2000 --users 5000
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8082 TELEGRAM_BOT_TOKEN=1:fake python main.py
+
+Bot के इस्तेमाल वाले methods (getMe, getUpdates, sendMessage, editMessageText,
+answerCallbackQuery, sendChatAction, deleteWebhook...) implement हैं; बाकी सब पर {"ok": true}।
+Updates bench/load_webhook.py के synthetic mix से --rate per second बनते हैं (0 = जितनी तेज़ी से
+bot मांगे)। Reply latency = update deliver होने से उस chat/callback के पहले bot response तक।
+Bot की अपनी throughput नापनी हो तो RATE_LIMIT_GLOBAL_PER_SEC / RATE_LIMIT_CHAT_PER_SEC और
+GEMINI_MAX_WORKERS बढ़ा दें, वरना असली Telegram limits (~30 msgs/s) ही bottleneck रहेंगी।
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+
+import tornado.web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load_webhook import percentile, synthetic_update
+
+BOT_USER = {'id': 1000001, 'is_bot': True, 'first_name': 'Crush', 'username': 'crush_fake_bot'}
+# इन methods पर --rate-limit-ratio से 429 लौट सकता है (Telegram भी यहीं flood limit लगाता है)
+LIMITED_METHODS = {'sendMessage', 'editMessageText', 'sendChatAction'}
+
+class FakeBotAPI:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.update_ids = itertools.count(1)
+        self.queue = deque()
+        self.generated = 0
+        self.delivered = 0
+        self.new_updates = asyncio.Event()
+        self.calls = {}
+        self.rate_limited = 0
+        self.message_ids = itertools.count(1)
+        # Reply latency के लिए: chat_id -> deliver times, callback id -> deliver time
+        self.waiting_chats = {}
+        self.waiting_callbacks = {}
+        self.latencies = []
+        self.started = time.monotonic()
+
+    def _generate(self, count):
+        count = min(count, self.args.updates - self.generated) if self.args.updates else count
+        for _ in range(max(0, count)):
+            update = synthetic_update(next(self.update_ids), self.rng, self.args.users)
+            while self.args.only_text and ('message' not in update or 'entities' in update['message']):
+                update = synthetic_update(update['update_id'], self.rng, self.args.users)
+            self.queue.append(update)
+            self.generated += 1
+        if count > 0:
+            self.new_updates.set()
+
+    async def producer(self):
+        """--rate updates/s की रफ़्तार से queue भरता है; rate 0 पर getUpdates खुद बनाता है"""
+        if not self.args.rate:
+            return
+        tick = 0.01
+        carry = 0.0
+        while not self.args.updates or self.generated < self.args.updates:
+            carry += self.args.rate * tick
+            self._generate(int(carry))
+            carry -= int(carry)
+            await asyncio.sleep(tick)
+
+    async def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        # offset से पहले वाले updates bot confirm कर चुका है
+        while self.queue and self.queue[0]['update_id'] < offset:
+            self.queue.popleft()
+        if not self.args.rate and len(self.queue) < limit:
+            self._generate(limit - len(self.queue))
+        if not self.queue and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), min(timeout, 30))
+            except asyncio.TimeoutError:
+                pass
+        batch = list(itertools.islice(self.queue, limit))
+        now = time.monotonic()
+        for update in batch:
+            if update.get('_delivered'):
+                continue
+            update['_delivered'] = True
+            self.delivered += 1
+            if 'callback_query' in update:
+                self.waiting_callbacks[update['callback_query']['id']] = now
+            else:
+                self.waiting_chats.setdefault(update['message']['chat']['id'], []).append(now)
+        return [{k: v for k, v in update.items() if k != '_delivered'} for update in batch]
+
+    def _answered_chat(self, chat_id):
+        # Debounce में कई messages का एक reply आता है: सबकी latency उसी reply तक
+        now = time.monotonic()
+        for delivered in self.waiting_chats.pop(chat_id, ()):
+            self.latencies.append((now - delivered) * 1000)
+
+    async def call(self, method, params):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        args = self.args
+        if args.latency_ms or args.jitter_ms:
+            await asyncio.sleep(self.rng.uniform(args.latency_ms, args.latency_ms + args.jitter_ms) / 1000)
+        if method in LIMITED_METHODS and self.rng.random() < args.rate_limit_ratio:
+            self.rate_limited += 1
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {args.retry_after}',
+                         'parameters': {'retry_after': args.retry_after}}
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self.get_updates(params)}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': BOT_USER}
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = params.get('chat_id')
+            if method == 'sendMessage':
+                self._answered_chat(chat_id)
+            return 200, {'ok': True, 'result': {
+                'message_id': params.get('message_id') or next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }}
+        if method == 'answerCallbackQuery':
+            delivered = self.waiting_callbacks.pop(str(params.get('callback_query_id')), None)
+            if delivered is not None:
+                self.latencies.append((time.monotonic() - delivered) * 1000)
+        return 200, {'ok': True, 'result': True}
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        self.latencies = []
+        sends = sum(self.calls.get(method, 0) for method in LIMITED_METHODS)
+        print(f"[fake-telegram] delivered {self.delivered} ({self.delivered / elapsed:.0f}/s), "
+              f"sends {sends}, 429s {self.rate_limited}, reply latency p50 {percentile(latencies, 50):.0f}ms "
+              f"p95 {percentile(latencies, 95):.0f}ms p99 {percentile(latencies, 99):.0f}ms (n={len(latencies)}), "
+              f"calls {dict(sorted(self.calls.items()))}", flush=True)
+
+def _params(request):
+    """PTB parameters form fields में भेजता है, हर value JSON-encoded; JSON body भी चलता है"""
+    if request.headers.get('Content-Type', '').startswith('application/json'):
+        return json.loads(request.body or b'{}')
+    params = {}
+    for name, values in request.body_arguments.items():
+        raw = values[-1].decode()
+        try:
+            params[name] = json.loads(raw)
+        except ValueError:
+            params[name] = raw
+    return params
+
+class MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api):
+        self.api = api
+
+    async def post(self, token, method):
+        status, body = await self.api.call(method, _params(self.request))
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(body, ensure_ascii=False))
+
+    get = post
+
+async def report_loop(api, interval):
+    while True:
+        await asyncio.sleep(interval)
+        api.report()
+
+async def serve(args):
+    api = FakeBotAPI(args)
+    app = tornado.web.Application([(r'/bot([^/]+)/(\w+)', MethodHandler, {'api': api})])
+    app.listen(args.port, args.host)
+    # Injected 429s हर request पर access log न भरें
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+    print(f"Fake Bot API http://{args.host}:{args.port} पर ({args.updates or '∞'} updates, "
+          f"{args.rate or 'max'} /s, {args.users} users)", flush=True)
+    await asyncio.gather(api.producer(), report_loop(api, args.report_seconds))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--updates', type=int, default=0, help='कुल updates (0 = बिना रुके)')
+    parser.add_argument('--rate', type=float, default=1000, help='updates/s (0 = getUpdates जितने मांगे)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--only-text', action='store_true', help='सिर्फ free-text messages (हर update Gemini तक जाए)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='हर API call में delay')
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.0, help='sends में से कितनों पर 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--report-seconds', type=float, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Webhook load test: चलते हुए bot के webhook पर synthetic updates POST करता है
+
+    BOT_MODE=webhook WEBHOOK_URL=https://... WEBHOOK_SECRET=s3cret python main.py
+    python bench/load_webhook.py --url http://127.0.0.1:8443/telegram --secret s3cret --updates 5000
+
+Latency यहाँ सिर्फ webhook के 200 लौटाने तक की है (update queue में जाने तक), handler की नहीं।
+--bad-secret-ratio से कुछ requests गलत secret के साथ जाती हैं और उन्हें 403 मिलना चाहिए।
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+import httpx
+
+def synthetic_update(update_id, rng, users):
+    """असली traffic जैसा mix: ज़्यादातर text messages, कुछ commands और button clicks"""
+    user_id = rng.randint(100000, 100000 + users - 1)
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'Load{user_id}'}
+    chat = {'id': user_id, 'type': 'private', 'first_name': user['first_name']}
+    now = int(time.time())
+    kind = rng.random()
+    if kind < 0.15:
+        return {
+            'update_id': update_id,
+            'callback_query': {
+                'id': str(update_id), 'from': user, 'chat_instance': str(user_id),
+                'data': rng.choice(['mini_games', 'mood_happy', 'game_love_calc', 'user_stats', 'back_to_main']),
+                'message': {'message_id': 1, 'date': now, 'chat': chat, 'text': 'menu'},
+            },
+        }
+    if kind < 0.25:
+        text = rng.choice(['/start', '/help', '/games', '/mood'])
+        entities = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+    else:
+        text = rng.choice(['hi', 'kaisi ho?', 'aaj mood thoda off hai', 'tum kya kar rahi ho', 'good night'])
+        entities = None
+    message = {'message_id': update_id, 'date': now, 'chat': chat, 'from': user, 'text': text}
+    if entities:
+        message['entities'] = entities
+    return {'update_id': update_id, 'message': message}
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def run(args):
+    rng = random.Random(args.seed)
+    update_ids = itertools.count(1)
+    latencies = []
+    statuses = {}
+    remaining = args.updates
+
+    async def worker(client):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            update_id = next(update_ids)
+            secret = 'wrong-secret' if rng.random() < args.bad_secret_ratio else args.secret
+            headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+            started = time.perf_counter()
+            try:
+                response = await client.post(args.url, json=synthetic_update(update_id, rng, args.users), headers=headers)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"updates     : {args.updates} in {elapsed:.2f}s ({args.updates / elapsed:,.0f} updates/s, concurrency {args.concurrency})")
+    print(f"status      : {dict(sorted(statuses.items(), key=str))}")
+    print(f"latency (ms): p50 {percentile(latencies, 50):.1f}  p95 {percentile(latencies, 95):.1f}  "
+          f"p99 {percentile(latencies, 99):.1f}  max {latencies[-1] if latencies else 0:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8443/telegram')
+    parser.add_argument('--secret', default=None, help='WEBHOOK_SECRET जैसा bot में set है')
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=40, help='Telegram के max_connections जितना रखें')
+    parser.add_argument('--users', type=int, default=500, help='कितने अलग synthetic users')
+    parser.add_argument('--bad-secret-ratio', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
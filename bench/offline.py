@@ -0,0 +1,56 @@
+"""Benchmarks के लिए offline Bot API: कोई network call नहीं, हर method का canned success जवाब
+
+    application = main.build_application(OfflineRequest())
+
+Handlers पूरा PTB pipeline चलाते हैं (request serialize, response parse), बस Telegram तक
+कुछ नहीं जाता। latency_ms से हर call में नकली network delay जोड़ा जा सकता है।
+"""
+import asyncio
+import json
+import time
+
+from telegram.request import BaseRequest
+
+BOT_USER = {'id': 1000001, 'is_bot': True, 'first_name': 'Crush', 'username': 'crush_bench_bot'}
+
+class OfflineRequest(BaseRequest):
+    """हर Bot API call का जवाब यहीं बनता है; calls में method-wise गिनती रहती है"""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.calls = {}
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint, params):
+        if endpoint == 'getMe':
+            return BOT_USER
+        if endpoint == 'getUpdates':
+            return []
+        if endpoint in ('sendMessage', 'editMessageText'):
+            chat_id = params.get('chat_id', 1)
+            return {
+                'message_id': params.get('message_id', self.calls[endpoint]),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': BOT_USER,
+                'text': params.get('text', ''),
+            }
+        return True
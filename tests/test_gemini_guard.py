@@ -0,0 +1,59 @@
+"""GeminiGuard circuit breaker: half-open probe cancel होने पर breaker अटकना नहीं चाहिए
+
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('USER_STORE_BACKEND', 'memory')
+
+import main  # noqa: E402
+
+
+def half_open_guard():
+    """Cooldown बीत चुका open breaker, जिसका इकलौता slot भरा है: अगली call probe बनकर slot का इंतज़ार करेगी"""
+    guard = main.GeminiGuard(max_limit=1, min_limit=1)
+    guard.state = 'open'
+    guard.opened_at = time.monotonic() - main.GEMINI_BREAKER_COOLDOWN_SECONDS - 1
+    guard.in_flight = 1
+    return guard
+
+
+class HalfOpenProbeTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_cancelled_probe_lets_next_call_in(self):
+        guard = half_open_guard()
+        probe = asyncio.create_task(guard.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(guard.state, 'half-open')
+        self.assertTrue(guard.probe_in_flight)
+
+        # Debounce: नया message आया, slot के इंतज़ार में खड़ा reply cancel
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+        self.assertFalse(guard.probe_in_flight)
+
+        guard.in_flight = 0
+        self.assertTrue(await guard.acquire())   # अगली call नया probe बनकर अंदर जाती है
+        await guard.release(True, 0.01, None)
+        self.assertEqual(guard.state, 'closed')
+
+    async def test_probe_queue_timeout_releases_probe(self):
+        guard = half_open_guard()
+        timeout = main.GEMINI_QUEUE_TIMEOUT_SECONDS
+        main.GEMINI_QUEUE_TIMEOUT_SECONDS = 0.01
+        try:
+            with self.assertRaises(main.GeminiUnavailable):
+                await guard.acquire()
+        finally:
+            main.GEMINI_QUEUE_TIMEOUT_SECONDS = timeout
+        self.assertFalse(guard.probe_in_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()